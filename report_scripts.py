@@ -1,36 +1,109 @@
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 import requests 
 import os
 from dotenv import load_dotenv
 import time 
+import shutil
 load_dotenv()
 
+# Copy-on-Write is always on from pandas 3.0, older versions need to opt in
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.options.mode.copy_on_write = True
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = None  # Falls back to the chunked pandas reader
+
+try:
+    import numba
+except ImportError:
+    numba = None  # Falls back to numexpr or plain numpy for the Idle Impact columns
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None  # Falls back to plain numpy for the Idle Impact arithmetic
+
 # CONFIG
 
 CSV_FILE_PATH = r"C:\Users\cballow\Documents\GitHub\AmazonDailyIdlePerformanceWorkflow\data.csv"
 
 SLACK_WEBHOOK_URL = os.environ.get("WEBHOOK_URL")
+SLACK_ENABLED = bool(SLACK_WEBHOOK_URL) and "YOUR_NEW_SLACK_APP_WEBHOOK_URL_HERE" not in SLACK_WEBHOOK_URL
 
 DATE_COLUMN = "Start Time (Local)"
 SHIFT_COLUMN = "Shift Code"
 EMPLOYEE_COLUMN = "Driver"
 IDLE_TIME_COLUMN = "Idle Time"
 
+REPORT_COLUMNS = [DATE_COLUMN, SHIFT_COLUMN, EMPLOYEE_COLUMN, IDLE_TIME_COLUMN]
+CSV_CHUNK_SIZE = 250_000
+CSV_READ_BUFFER_SIZE = 1024 * 1024
+
+PARQUET_CACHE_DIR_NAME = "parquet_cache"
+PARTITION_COLUMN = "date"
+CACHE_STAMP_FILE_NAME = "_csv_stamp"  # Leading underscore keeps pyarrow.dataset from reading it as data
+
 LATE_SHIFT_START_HOUR = 20
 BENCHMARK_IDLE_TIME = 0.68
 
+# Idle Impact at or above each breakpoint gets the matching emoji, anything below 0 is Great
+IDLE_IMPACT_BREAKPOINTS = [20, 10, 0]
+IMPACT_EMOJIS = ['🔴', '🟠', '🟡', '🟢']  # Very Bad, Bad, Fine, Great
+
+# Below these many driver rows the numba compile / numexpr call costs more than it saves
+JIT_MIN_ROWS = 10_000
+NUMEXPR_MIN_ROWS = 1_000
+
+
+def get_impact_emojis(idle_impacts):
+    """Returns a color-coded emoji for every value in an array of Idle Impacts."""
+    conditions = [idle_impacts >= breakpoint for breakpoint in IDLE_IMPACT_BREAKPOINTS]
+    return np.select(conditions, IMPACT_EMOJIS[:-1], default=IMPACT_EMOJIS[-1])
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def idle_impact_kernel(avg_idle_times, move_counts, benchmark, breakpoints):
+        """Computes Idle Impact and the index of its emoji in one pass over the drivers."""
+        impacts = np.empty(avg_idle_times.size)
+        status_indexes = np.empty(avg_idle_times.size, np.int8)
+        for i in range(avg_idle_times.size):
+            impact = (avg_idle_times[i] - benchmark) * move_counts[i]
+            impacts[i] = impact
+            status_index = breakpoints.size
+            for j in range(breakpoints.size):
+                if impact >= breakpoints[j]:
+                    status_index = j
+                    break
+            status_indexes[i] = status_index
+        return impacts, status_indexes
+
+def calculate_idle_impacts(avg_idle_times, move_counts):
+    """
+    Returns the Idle Impact and its status emoji for every driver row, using
+    the numba kernel or numexpr when installed and the table is large enough.
+    """
+    if numba is not None and avg_idle_times.size >= JIT_MIN_ROWS:
+        impacts, status_indexes = idle_impact_kernel(
+            avg_idle_times, move_counts.astype(np.float64),
+            BENCHMARK_IDLE_TIME, np.array(IDLE_IMPACT_BREAKPOINTS, dtype=np.float64)
+        )
+        return impacts, np.array(IMPACT_EMOJIS)[status_indexes]
 
-def get_impact_emoji(idle_impact):
-    """Returns a color-coded emoji based on the Idle Impact value."""
-    if idle_impact >= 20:
-        return '🔴'  # Very Bad
-    elif idle_impact >= 10:
-        return '🟠'  # Bad
-    elif idle_impact >= 0:
-        return '🟡'  # Fine
-    else: # Less than 0
-        return '🟢'  # Great
+    if numexpr is not None and avg_idle_times.size >= NUMEXPR_MIN_ROWS:
+        impacts = numexpr.evaluate(
+            "(avg_idle_times - benchmark) * move_counts",
+            local_dict={'avg_idle_times': avg_idle_times, 'move_counts': move_counts, 'benchmark': BENCHMARK_IDLE_TIME}
+        )
+    else:
+        impacts = (avg_idle_times - BENCHMARK_IDLE_TIME) * move_counts
+    return impacts, get_impact_emojis(impacts)
 
 def get_site_average_emoji(site_average):
     """Returns a color-coded emoji based on the site-wide average idle time."""
@@ -48,22 +121,23 @@ def format_for_slack(df, headers=["Status", "Driver", "Avg Idle Time", "% of Mov
     Takes a DataFrame and formats it into a text-based table string
     with borders, suitable for a Slack code block.
     """
-    df_display = df.copy()
+    df_display = df.copy(deep=False)  # Copy-on-Write keeps the caller's frame untouched
 
-    df_display["Avg Idle Time"] = df_display["Avg Idle Time"].map('{:.2f}'.format)
-    df_display["% of Moves"] = df_display["% of Moves"].map('{:.1%}'.format) 
-    df_display["Idle Impact"] = df_display["Idle Impact"].map('{:+.2f}'.format) 
+    df_display["Avg Idle Time"] = np.char.mod('%.2f', df_display["Avg Idle Time"].to_numpy())
+    df_display["% of Moves"] = np.char.mod('%.1f%%', df_display["% of Moves"].to_numpy() * 100)
+    df_display["Idle Impact"] = np.char.mod('%+.2f', df_display["Idle Impact"].to_numpy())
 
     df_display["Status"] = df_display["Status"] + ' '
-    col_widths = {col: max(df_display[col].astype(str).apply(len).max(), len(col)) for col in df_display.columns}
+    col_widths = {col: max(df_display[col].astype(str).str.len().max(), len(col)) for col in df_display.columns}
 
     separator = "+-" + "-+-".join(['-' * col_widths[col] for col in df_display.columns]) + "-+"
     header_line = "| " + " | ".join([col.ljust(col_widths[col]) for col in df_display.columns]) + " |"
 
     table_lines = [separator, header_line, separator]
 
-    for _, row in df_display.iterrows():
-        row_values = [str(row[col]).ljust(col_widths[col]) for col in df_display.columns]
+    widths = [col_widths[col] for col in df_display.columns]
+    for row in df_display.itertuples(index=False, name=None):
+        row_values = [str(value).ljust(width) for value, width in zip(row, widths)]
         table_lines.append("| " + " | ".join(row_values) + " |")
 
     table_lines.append(separator)
@@ -83,6 +157,109 @@ def format_summary_box(summary_parts):
     return "\n".join(boxed_lines)
 
 
+def refresh_parquet_cache(file_path, cache_dir):
+    """
+    Rewrites the CSV as a Parquet dataset partitioned by day, but only if the
+    cache is missing or was built from a different CSV, version of the CSV,
+    or set of conversion options.
+    """
+    # Drivers and shift codes repeat heavily, so keep them dictionary-encoded from the
+    # CSV read through to the Parquet files and into pandas as categoricals
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=REPORT_COLUMNS,
+        column_types={
+            DATE_COLUMN: pa.timestamp('ns'),
+            SHIFT_COLUMN: pa.dictionary(pa.int32(), pa.string()),
+            EMPLOYEE_COLUMN: pa.dictionary(pa.int32(), pa.string())
+        },
+        strings_can_be_null=True  # Blank drivers and shift codes are missing, as pandas reads them
+    )
+
+    # Everything the cache was built from, kept inside the cache: which CSV, which version
+    # of it (modification time and size), and how its columns were converted
+    csv_stat = os.stat(file_path)
+    csv_stamp = "\n".join([
+        os.path.abspath(file_path),
+        f"{csv_stat.st_mtime_ns} {csv_stat.st_size}",
+        repr(convert_options.include_columns),
+        repr(sorted((column, str(column_type)) for column, column_type in convert_options.column_types.items())),
+        f"strings_can_be_null={convert_options.strings_can_be_null}"
+    ])
+    stamp_path = os.path.join(cache_dir, CACHE_STAMP_FILE_NAME)
+    if os.path.isfile(stamp_path):
+        with open(stamp_path) as stamp_file:
+            if stamp_file.read() == csv_stamp:
+                return
+
+    print("-> Parquet cache is missing or out of date, rebuilding it from the CSV...")
+    table = pa_csv.read_csv(file_path, convert_options=convert_options)
+    table = table.append_column(PARTITION_COLUMN, pc.cast(table[DATE_COLUMN], pa.date32()))
+
+    # Write next to the old cache and swap it in, so a failed rebuild never leaves a partial cache behind
+    staging_dir = cache_dir + ".tmp"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    ds.write_dataset(
+        table, staging_dir, format='parquet',
+        partitioning=ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.date32())]), flavor='hive'),
+        max_partitions=100_000
+    )
+    with open(os.path.join(staging_dir, CACHE_STAMP_FILE_NAME), 'w') as stamp_file:
+        stamp_file.write(csv_stamp)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.rename(staging_dir, cache_dir)
+
+def read_day_activity_parquet(cache_dir, target_date):
+    """Reads only the target day's partition of the Parquet cache."""
+    dataset = ds.dataset(
+        cache_dir, format='parquet',
+        partitioning=ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.date32())]), flavor='hive')
+    )
+    table = dataset.to_table(columns=REPORT_COLUMNS, filter=ds.field(PARTITION_COLUMN) == target_date)
+
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+def read_day_activity_chunked(file_path, target_date):
+    """
+    Reads the report columns with pandas in chunks. Start times stay raw
+    strings until the target day's rows are picked out by their YYYY-MM-DD
+    prefix, so only those rows ever get parsed into dates.
+    """
+    day_prefix = target_date.isoformat()
+    kept_chunks = []
+    first_start_time = None
+    with open(file_path, 'rb', buffering=CSV_READ_BUFFER_SIZE) as csv_file:
+        for chunk in pd.read_csv(csv_file, usecols=REPORT_COLUMNS, dtype={DATE_COLUMN: str}, chunksize=CSV_CHUNK_SIZE):
+            if first_start_time is None and chunk[DATE_COLUMN].notna().any():
+                first_start_time = chunk[DATE_COLUMN].dropna().iat[0]
+            kept_chunks.append(chunk[chunk[DATE_COLUMN].str.startswith(day_prefix, na=False)])
+
+    activity = pd.concat(kept_chunks, ignore_index=True)
+
+    # Non-ISO start times would never match the prefix, so fail loudly instead of reporting no data
+    if activity.empty and first_start_time is not None:
+        try:
+            datetime.strptime(first_start_time[:10], '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f"'{DATE_COLUMN}' values must start with YYYY-MM-DD, found {first_start_time!r}")
+
+    activity[DATE_COLUMN] = pd.to_datetime(activity[DATE_COLUMN])
+    return activity
+
+def read_day_activity(file_path, target_date):
+    """
+    Reads all activity that started on the target day, going through the
+    Parquet cache next to the CSV when pyarrow is available.
+    """
+    if pa is not None:
+        # One cache per CSV, so two exports in the same folder don't keep rebuilding each other's
+        csv_name = os.path.splitext(os.path.basename(file_path))[0]
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), f"{csv_name}_{PARQUET_CACHE_DIR_NAME}")
+        refresh_parquet_cache(file_path, cache_dir)
+        return read_day_activity_parquet(cache_dir, target_date)
+
+    return read_day_activity_chunked(file_path, target_date)
+
+
 # SCRIPT LOGIC
 
 def analyze_day_performance(file_path, target_day_str):
@@ -95,60 +272,51 @@ def analyze_day_performance(file_path, target_day_str):
         print("Starting the daily report workflow...")
 
 
-        print("\nStep 1: Reading CSV file...")
+        print("\nStep 1: Reading all activity on the target day...")
         step_time = time.time()
-        df = pd.read_csv(file_path)
-        print(f"-> Done. Read {len(df)} rows in {time.time() - step_time:.2f} seconds.")
-
-        print("\nStep 2: Converting date column...")
-        step_time = time.time()
-        df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN])
-        print(f"-> Done. Converted dates in {time.time() - step_time:.2f} seconds.")
+        target_date = pd.to_datetime(target_day_str).date()
+        activity_on_target_day = read_day_activity(file_path, target_date)
+        print(f"-> Done. Found {len(activity_on_target_day)} activities on {target_day_str} in {time.time() - step_time:.2f} seconds.")
 
-        print("\nStep 3: Cleaning shift codes...")
+        print("\nStep 2: Cleaning shift codes...")
         step_time = time.time()
-        df['Cleaned Shift'] = df[SHIFT_COLUMN].str.split('-').str[-1]
+        activity_on_target_day['Cleaned Shift'] = activity_on_target_day[SHIFT_COLUMN].str.rsplit('-', n=1).str[-1]
         print(f"-> Done. Cleaned shifts in {time.time() - step_time:.2f} seconds.")
 
-        print("\nStep 4: Filtering for all activity on the target day...")
-        step_time = time.time()
-
-        target_date = pd.to_datetime(target_day_str).date()
-
-        activity_on_target_day = df[df[DATE_COLUMN].dt.date == target_date].copy()
-        print(f"-> Done. Found {len(activity_on_target_day)} activities on {target_day_str} in {time.time() - step_time:.2f} seconds.")
-
         if activity_on_target_day.empty:
             message = f"No data found for the date: {target_day_str}"
             print(message)
             send_to_slack(message)
             return
 
-        total_daily_moves = len(activity_on_target_day)
-        site_average = activity_on_target_day[IDLE_TIME_COLUMN].mean()
-
-        activity_on_target_day['Reporting Shift'] = activity_on_target_day['Cleaned Shift']
+        idle_times = activity_on_target_day[IDLE_TIME_COLUMN].to_numpy()
+        total_daily_moves = idle_times.size
+        site_average = np.nanmean(idle_times)
+
+        # Non-numeric shift codes become NaN here and simply never count as overnight
+        cleaned_shifts = activity_on_target_day['Cleaned Shift']
+        shift_codes = pd.to_numeric(cleaned_shifts, errors='coerce').to_numpy()
+        activity_hours = activity_on_target_day[DATE_COLUMN].dt.hour.to_numpy()
+        overnight_condition = (activity_hours < 5) & (shift_codes >= LATE_SHIFT_START_HOUR * 100)
+        activity_on_target_day['Reporting Shift'] = np.where(
+            overnight_condition,
+            (cleaned_shifts + ' (Overnight)').to_numpy(),
+            cleaned_shifts.to_numpy()
+        )
 
-        try:
-            overnight_condition = (activity_on_target_day[DATE_COLUMN].dt.hour < 5) & \
-                                  (pd.to_numeric(activity_on_target_day['Cleaned Shift']) >= LATE_SHIFT_START_HOUR * 100)
-            activity_on_target_day.loc[overnight_condition, 'Reporting Shift'] = activity_on_target_day['Cleaned Shift'] + ' (Overnight)'
-        except Exception:
-            print("Could not apply overnight logic, continuing with standard shifts.")
-            pass
+        # Group on small integer codes instead of hashing driver and shift strings. Drivers read
+        # from Parquet arrive in file order, so sort the categories to keep groupby alphabetical
+        drivers = activity_on_target_day[EMPLOYEE_COLUMN].astype('category')
+        activity_on_target_day[EMPLOYEE_COLUMN] = drivers.cat.set_categories(sorted(drivers.cat.categories))
+        activity_on_target_day['Reporting Shift'] = activity_on_target_day['Reporting Shift'].astype('category')
 
         all_shifts_in_report = activity_on_target_day['Reporting Shift'].unique()
 
-        def shift_sort_key(shift_name):
-            if '(Overnight)' in shift_name:
-                return f"0_{shift_name}"
-            else:
-                return f"1_{shift_name}"
-
-        sorted_shifts = sorted(all_shifts_in_report, key=shift_sort_key)
+        # Overnight shifts from the previous day come first, then the rest in order
+        sorted_shifts = sorted(all_shifts_in_report, key=lambda shift_name: ('(Overnight)' not in shift_name, shift_name))
         print(f"\nFound data for shifts: {sorted_shifts}")
 
-        print("\nStep 5: Building the Slack message...")
+        print("\nStep 3: Building the Slack message...")
 
         message_parts = []
         formatted_date = pd.to_datetime(target_day_str).strftime('%A, %B %d')
@@ -171,7 +339,15 @@ def analyze_day_performance(file_path, target_day_str):
         summary_parts.append("") 
 
         summary_parts.append("Top 5 Highest Idle Time Incidents")
-        top_5 = activity_on_target_day.nlargest(5, IDLE_TIME_COLUMN)
+        # Find the 5th largest idle time in O(n), then stable-sort every row at or above it
+        # so ties at 5th place keep the earliest rows, the same as nlargest
+        top_count = min(5, np.count_nonzero(~np.isnan(idle_times)))
+        top_idx = np.empty(0, dtype=np.intp)
+        if top_count:
+            threshold = -np.partition(-idle_times, top_count - 1)[top_count - 1]
+            top_idx = np.flatnonzero(idle_times >= threshold)
+            top_idx = top_idx[np.argsort(-idle_times[top_idx], kind='stable')][:top_count]
+        top_5 = activity_on_target_day.iloc[top_idx]
         for _, row in top_5.iterrows():
             incident_time = row[DATE_COLUMN].strftime('%H:%M')
             driver = row[EMPLOYEE_COLUMN]
@@ -181,19 +357,29 @@ def analyze_day_performance(file_path, target_day_str):
         summary_block = format_summary_box(summary_parts)
         message_parts.append(f"```{summary_block}```") 
 
+        shift_driver_stats = activity_on_target_day.groupby(['Reporting Shift', EMPLOYEE_COLUMN], observed=True).agg(
+            Avg_Idle_Time=(IDLE_TIME_COLUMN, 'mean'),
+            Move_Count=(IDLE_TIME_COLUMN, 'size')
+        )
+        shift_driver_stats['% of Moves'] = shift_driver_stats['Move_Count'] / total_daily_moves
+        idle_impacts, statuses = calculate_idle_impacts(
+            shift_driver_stats['Avg_Idle_Time'].to_numpy(), shift_driver_stats['Move_Count'].to_numpy()
+        )
+        shift_driver_stats['Idle Impact'] = idle_impacts
+        shift_driver_stats.insert(0, "Status", statuses)
+        shift_driver_stats.rename(columns={'Avg_Idle_Time': 'Avg Idle Time'}, inplace=True)
+
+        # Shifts whose drivers are all missing drop out of the groupby but still get a section
+        shifts_with_drivers = set(shift_driver_stats.index.get_level_values('Reporting Shift'))
+        no_driver_summary = shift_driver_stats.iloc[:0].droplevel('Reporting Shift').reset_index()
+
         all_shift_reports = []
         for shift_name in sorted_shifts:
-            shift_activity = activity_on_target_day[activity_on_target_day['Reporting Shift'] == shift_name].copy()
-            shift_summary = shift_activity.groupby(EMPLOYEE_COLUMN).agg(
-                Avg_Idle_Time=(IDLE_TIME_COLUMN, 'mean'),
-                Move_Count=(IDLE_TIME_COLUMN, 'size')
-            )
-            shift_summary['% of Moves'] = shift_summary['Move_Count'] / total_daily_moves
-            shift_summary['Idle Impact'] = (shift_summary['Avg_Idle_Time'] - BENCHMARK_IDLE_TIME) * shift_summary['Move_Count']
-            shift_summary.insert(0, "Status", shift_summary["Idle Impact"].apply(get_impact_emoji))
-            shift_summary = shift_summary.sort_values('Idle Impact') # Sort by the new Idle Impact
-            shift_summary.rename(columns={'Avg_Idle_Time': 'Avg Idle Time'}, inplace=True)
-            shift_summary.reset_index(inplace=True)
+            if shift_name in shifts_with_drivers:
+                shift_summary = shift_driver_stats.xs(shift_name, level='Reporting Shift')
+                shift_summary = shift_summary.sort_values('Idle Impact').reset_index() # Sort by Idle Impact
+            else:
+                shift_summary = no_driver_summary
 
             display_shift = shift_name.replace(' (Overnight)', '')
             formatted_shift = f"{display_shift[:2]}:{display_shift[2:]}"
@@ -221,34 +407,33 @@ def analyze_day_performance(file_path, target_day_str):
             except ValueError:
                 continue
 
+        report_header = "\n".join(message_parts)
         if split_index == -1 or split_index == len(all_shift_reports) - 1:
-            final_message = "\n".join(message_parts) + "".join(all_shift_reports)
-            send_to_slack(final_message)
+            send_to_slack(report_header + "".join(all_shift_reports))
         else:
-            message_1_shifts = all_shift_reports[:split_index + 1]
-            final_message_1 = "\n".join(message_parts) + "".join(message_1_shifts)
-            send_to_slack(final_message_1)
+            send_to_slack(report_header + "".join(all_shift_reports[:split_index + 1]))
 
             time.sleep(1) # Pause for a second before sending the next part
 
-            message_2_shifts = all_shift_reports[split_index + 1:]
-            final_message_2 = "📊 *Daily Idling Time Report (continued)*\n" + "".join(message_2_shifts)
-            send_to_slack(final_message_2)
+            send_to_slack("📊 *Daily Idling Time Report (continued)*\n" + "".join(all_shift_reports[split_index + 1:]))
 
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         send_to_slack(f"An unexpected error occurred in the daily report: {e}")
 
 
+# Reused for every send so a split report doesn't repeat the TLS handshake
+SLACK_SESSION = requests.Session()
+
 def send_to_slack(message):
     """Sends a message to the configured Slack webhook."""
-    if "YOUR_NEW_SLACK_APP_WEBHOOK_URL_HERE" in SLACK_WEBHOOK_URL:
+    if not SLACK_ENABLED:
         print("\nWARNING: Slack webhook URL is not set. Skipping notification.")
         return
 
     try:
         payload = {"text": message}
-        response = requests.post(SLACK_WEBHOOK_URL, json=payload, timeout=30)
+        response = SLACK_SESSION.post(SLACK_WEBHOOK_URL, json=payload, timeout=30)
         if response.status_code == 200:
             print(f"-> Done. Successfully sent report to Slack!")
         else:
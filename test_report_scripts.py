@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+import report_scripts
+
+
+def test_idle_impact_kernel_matches_numpy(monkeypatch):
+    """The numba kernel rates every row the same as the numpy path, NaN included."""
+    pytest.importorskip("numba")
+
+    benchmark = report_scripts.BENCHMARK_IDLE_TIME
+    # Averages landing exactly on each breakpoint, just below it, and a missing average
+    avg_idle_times = np.array([benchmark + 20.0, benchmark + 10.0, benchmark, benchmark - 0.01,
+                               benchmark + 9.99, 3.5, 0.1, np.nan])
+    move_counts = np.array([1, 1, 7, 3, 1, 12, 40, 5])
+
+    monkeypatch.setattr(report_scripts, "JIT_MIN_ROWS", 0)
+    jit_impacts, jit_statuses = report_scripts.calculate_idle_impacts(avg_idle_times, move_counts)
+
+    numpy_impacts = (avg_idle_times - benchmark) * move_counts
+    np.testing.assert_array_equal(jit_impacts, numpy_impacts)
+    np.testing.assert_array_equal(jit_statuses, report_scripts.get_impact_emojis(numpy_impacts))
+    assert list(jit_statuses) == ['🔴', '🟠', '🟡', '🟢', '🟡', '🔴', '🟢', '🟢']